@@ -11,8 +11,10 @@ from datetime import datetime, timezone
 from google.oauth2.service_account import Credentials
 from gspread_dataframe import set_with_dataframe
 from flask import Flask
+from profiling import profiled, profiling_bp
 
 app = Flask(__name__)
+app.register_blueprint(profiling_bp)
 
 # ======================================================
 # 🔐 Authentification Google Sheets
@@ -103,6 +105,7 @@ def atr(df, period=14):
 # ======================================================
 # 📊 Mise à jour Google Sheets
 # ======================================================
+@profiled
 def update_sheet():
     print("🧠 Début update_sheet()", flush=True)
     try:
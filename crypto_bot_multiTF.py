@@ -13,8 +13,12 @@ from datetime import datetime
 from google.oauth2.service_account import Credentials
 from gspread_dataframe import set_with_dataframe
 from flask import Flask
+from profiling import profiled, profiling_bp
+from levels import LevelIndex
+from memory_budget import LRUCache, MEMORY_MODE, MEMORY_BUDGET_MB, current_rss_mb, memory_pressure, release_memory
 
 app = Flask(__name__)
+app.register_blueprint(profiling_bp)
 
 # ======================================================
 # ⚙️ CONFIGURATION V30 (ZERO TRUST SAFETY FIX)
@@ -27,8 +31,24 @@ RENDER_EXTERNAL_URL = os.getenv("RENDER_EXTERNAL_URL")
 UPDATE_FREQUENCY = 600  # 10 minutes
 RISK_PER_TRADE_PCT = 0.02 
 MIN_ORDER_SIZE_USD = 11.0 
+MIN_RR = 1.5
+SUPPORT_TOUCH_PCT = 0.015
 
 CORE_WATCHLIST = ["BTC/USDC", "ETH/USDC", "SOL/USDC", "BNB/USDC"]
+DYNAMIC_WATCHLIST_SIZE = 25
+DYNAMIC_WATCHLIST_SIZE_SOFT = 10  # délestage quand la mémoire approche du budget
+
+# Cache borné (LRU) des bougies journalières, valables jusqu'à la clôture UTC
+# suivante. Les bougies 1h et le carnet, relus une fois par cycle, ne sont pas
+# mis en cache : leur dernière valeur doit être fraîche à chaque cycle.
+CANDLE_CACHE_SIZE = int(os.getenv("CANDLE_CACHE_SIZE", 60))
+CACHED_TIMEFRAMES = {"1d": 86400}  # timeframe -> durée d'une bougie (s)
+
+candle_cache = LRUCache(CANDLE_CACHE_SIZE)
+# Index de niveaux par symbole (pas d'expiration : reconstruit s'il est évincé)
+LEVEL_INDEX_SIZE = int(os.getenv("LEVEL_INDEX_SIZE", 60))
+level_indexes = LRUCache(LEVEL_INDEX_SIZE)
+MEMORY_CHECK_EVERY = 5  # symboles entre deux contrôles du RSS pendant un scan
 
 # ======================================================
 # 🔐 CONNEXIONS
@@ -77,6 +97,32 @@ def smart_format(value, is_currency=True, precision=2):
         else: return f"{value:.8f}{suffix}"
     except: return "-"
 
+# Les résultats restent numériques pendant le scan ; le texte n'est produit
+# qu'au moment d'écrire la feuille.
+CURRENCY_COLS = ["Prix", "Mon_Bag", "Mise ($)", "Frais Est.",
+                 "SL Déclenchement", "SL Limite", "Trailing Stop", "TP (Cible)"]
+RATIO_COLS = {"R:R": 2, "RSI": 1, "ADX": 1, "Vol Ratio": 1, "Dist MA200%": 1}
+LABEL_COLS = ["Crypto", "Conseil", "Action"]
+
+def compact_results(df):
+    for col in RATIO_COLS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float32)
+    for col in LABEL_COLS:
+        df[col] = df[col].fillna("").astype("category")
+    return df
+
+def format_for_sheet(df):
+    out = df.copy()
+    for col in CURRENCY_COLS:
+        out[col] = out[col].map(smart_format)
+    # " (Min)" seulement si une mise est affichée
+    forced = df["Mise Min"].eq(True) & df["Mise ($)"].notna()
+    out["Mise ($)"] = out["Mise ($)"] + forced.map({True: " (Min)", False: ""})
+    for col, digits in RATIO_COLS.items():
+        vals = out[col].astype(float).round(digits)
+        out[col] = vals.astype(object).where(vals.notna(), "-")
+    return out
+
 def send_discord_alert(message, color_code=0x3498db):
     if not DISCORD_WEBHOOK_URL: return
     try:
@@ -104,17 +150,33 @@ def get_dynamic_watchlist(all_tickers, limit=25):
     except: return CORE_WATCHLIST
 
 def get_binance_data(symbol, timeframe, limit=200):
+    key = (symbol, timeframe, limit)
+    period = CACHED_TIMEFRAMES.get(timeframe)
+    if period:
+        df = candle_cache.get(key)
+        if df is not None: return df
     try:
         ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
         if not ohlcv or len(ohlcv) < limit: return None
         
         df = pd.DataFrame(ohlcv, columns=['ts', 'open', 'high', 'low', 'close', 'volume'])
         df['ts'] = pd.to_datetime(df['ts'], unit='ms')
+        # float32 suffit pour l'OHLCV (~7 chiffres significatifs) en mode budget
+        dtype = np.float32 if MEMORY_MODE else float
         for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = df[col].astype(float)
+            df[col] = df[col].astype(dtype)
+        if period: candle_cache.put(key, df, period - (time.time() % period))
         return df
     except: return None
 
+def get_book_ratio(symbol):
+    try:
+        book = exchange.fetch_order_book(symbol, limit=20)
+        bid = sum([b[1] for b in book['bids']])
+        ask = sum([a[1] for a in book['asks']])
+        return bid / ask if ask > 0 else 1.0
+    except: return 1.0
+
 def get_live_price(symbol):
     try: return float(exchange.fetch_ticker(symbol)['last'])
     except: return None
@@ -152,6 +214,25 @@ def get_portfolio_data():
         print(f"❌ Erreur CRITIQUE Portfolio: {e}")
         return {}, 0, 0 
 
+def memory_self_check():
+    """Contrôle le RSS ; près du budget, vide les caches avant de décider du délestage."""
+    pressure = memory_pressure()
+    if pressure != "OK":
+        candle_cache.clear()
+        release_memory()
+        pressure = memory_pressure()
+        print(f"🧯 Mémoire {current_rss_mb():.0f}/{MEMORY_BUDGET_MB:.0f} Mo → {pressure}", flush=True)
+    return pressure
+
+def get_level_index(symbol, df_1h, df_1d):
+    levels = level_indexes.get(symbol)
+    if levels is None:
+        levels = LevelIndex()
+        level_indexes.put(symbol, levels)
+    levels.update("1h", df_1h)
+    levels.update("1d", df_1d)
+    return levels
+
 # ======================================================
 # 📜 HISTORIQUE
 # ======================================================
@@ -164,7 +245,26 @@ def get_all_history():
             ws_hist.append_row(["Date", "Crypto", "Prix", "Signal", "Analyse"])
             return []
         return ws_hist.get_all_records()
-    except: return []
+    except: return None  # échec de lecture, à distinguer d'un journal vide
+
+# Seul le dernier signal par crypto sert : on le garde en mémoire plutôt que
+# de relire tout le journal (qui grossit sans limite) à chaque cycle.
+# Le journal est relu à chaque cycle tant qu'une lecture n'a pas réussi.
+LAST_SIGNALS = {}
+last_signals_loaded = False
+
+def get_last_signals():
+    global last_signals_loaded
+    if not last_signals_loaded:
+        records = get_all_history()
+        if records is None:
+            print("⚠️ Journal illisible, nouvelle tentative au prochain cycle", flush=True)
+        else:
+            # Le journal contient aussi les signaux ajoutés depuis : il fait foi
+            for r in records:
+                if r.get("Crypto"): LAST_SIGNALS[r["Crypto"]] = r.get("Signal", "AUCUN")
+            last_signals_loaded = True
+    return LAST_SIGNALS
 
 def append_history_log(symbol, price, full_signal, narrative):
     try:
@@ -173,12 +273,13 @@ def append_history_log(symbol, price, full_signal, narrative):
         paris_tz = pytz.timezone('Europe/Paris')
         now_str = datetime.now(paris_tz).strftime("%d/%m/%Y - %H:%M")
         ws_hist.append_row([now_str, symbol, smart_format(price), full_signal, narrative])
+        LAST_SIGNALS[symbol] = full_signal
     except: pass
 
 # ======================================================
 # 🧠 INDICATEURS TECHNIQUES
 # ======================================================
-def calculate_all_indicators(symbol):
+def calculate_all_indicators(symbol, light=False):
     time.sleep(1.2) 
     
     df_1h = get_binance_data(symbol, "1h")
@@ -234,13 +335,11 @@ def calculate_all_indicators(symbol):
     r1, r2 = (2 * pivot) - low_d, pivot + (high_d - low_d)
     s1, s2 = (2 * pivot) - high_d, pivot - (high_d - low_d)
 
-    # Order Book
-    try:
-        book = exchange.fetch_order_book(symbol, limit=20)
-        bid = sum([b[1] for b in book['bids']])
-        ask = sum([a[1] for a in book['asks']])
-        ob_ratio = bid / ask if ask > 0 else 1.0
-    except: ob_ratio = 1.0
+    # Index de niveaux (pivots multi-jours, swings, profil de volume)
+    levels = get_level_index(symbol, df_1h, df_1d)
+
+    # Order Book (optionnel : sauté en délestage mémoire)
+    ob_ratio = 1.0 if light else get_book_ratio(symbol)
 
     vol_mean = df_1h['volume'].rolling(20).mean().iloc[-1]
     vol_cur = df_1h['volume'].iloc[-1]
@@ -252,9 +351,11 @@ def calculate_all_indicators(symbol):
         "bb_width": bb_width.iloc[-1], "bb_lower": bb_lower.iloc[-1], "bb_upper": bb_upper.iloc[-1],
         "ema50_1h": ema50_1h, "dist_ma200": dist_ma200_pct,
         "ob_ratio": ob_ratio, "vol_ratio": vol_ratio,
-        "pivot_r1": r1, "pivot_r2": r2, "pivot_s1": s1
+        "pivot_r1": r1, "pivot_r2": r2, "pivot_s1": s1,
+        "levels": levels
     }
 
+@profiled
 def analyze_market_and_portfolio():
     print("🧠 Analyse V30 Zero Trust...", flush=True)
     
@@ -268,8 +369,14 @@ def analyze_market_and_portfolio():
     my_positions, cash_available, total_capital = get_portfolio_data()
     print(f"💰 Equity: {total_capital} $ | Cash Dispo: {cash_available} $")
 
-    dynamic_list = list(set(CORE_WATCHLIST + list(my_positions.keys()) + get_dynamic_watchlist(all_tickers, 25)))
-    history_records = get_all_history()
+    # Délestage : moins de cryptos dynamiques en SOFT, aucune en HARD
+    pressure = memory_self_check()
+    essential = set(CORE_WATCHLIST + list(my_positions.keys()))
+    extra = []
+    if pressure == "OK": extra = get_dynamic_watchlist(all_tickers, DYNAMIC_WATCHLIST_SIZE)
+    elif pressure == "SOFT": extra = get_dynamic_watchlist(all_tickers, DYNAMIC_WATCHLIST_SIZE_SOFT)
+    dynamic_list = list(essential.union(extra))
+    last_signals = get_last_signals()
     
     # --- MACRO ---
     market_regime = "RANGE" 
@@ -283,23 +390,22 @@ def analyze_market_and_portfolio():
             elif change_24h < 0: btc_trend = "BEAR"
     except: pass
     
-    try: fng_val = int(requests.get("https://api.alternative.me/fng/?limit=1", timeout=3).json()['data'][0]['value'])
-    except: fng_val = 50
+    fng_val = 50
+    if pressure != "HARD":
+        try: fng_val = int(requests.get("https://api.alternative.me/fng/?limit=1", timeout=3).json()['data'][0]['value'])
+        except: pass
 
     results = []
     
+    # Colonnes absentes = "-" à l'écriture
     results.append({
-        "Crypto": "💰 TRÉSORERIE", "Prix": "-", "Mon_Bag": smart_format(cash_available), 
-        "Conseil": "CAPITAL", "Action": "", "Score": 2000, "Mise ($)": "-", "Frais Est.": "-",
-        "SL Déclenchement": "-", "SL Limite": "-", "Trailing Stop": "-", "TP (Cible)": "-",
-        "R:R": "-", "RSI": "-", "ADX": "-", "Vol Ratio": "-", "Dist MA200%": "-",
+        "Crypto": "💰 TRÉSORERIE", "Mon_Bag": cash_available,
+        "Conseil": "CAPITAL", "Action": "", "Score": 2000,
         "Analyse Complète 🧠": f"Capital prêt: {smart_format(cash_available)}"
     })
     results.append({
-        "Crypto": "🌍 MACRO", "Prix": "-", "Mon_Bag": "-", 
-        "Conseil": "INFO", "Action": "", "Score": 1999, "Mise ($)": "-", "Frais Est.": "-",
-        "SL Déclenchement": "-", "SL Limite": "-", "Trailing Stop": "-", "TP (Cible)": "-",
-        "R:R": "-", "RSI": "-", "ADX": "-", "Vol Ratio": "-", "Dist MA200%": "-",
+        "Crypto": "🌍 MACRO",
+        "Conseil": "INFO", "Action": "", "Score": 1999,
         "Analyse Complète 🧠": f"Mode: {market_regime} | BTC {btc_trend} | Sentiment: {fng_val}"
     })
 
@@ -309,6 +415,10 @@ def analyze_market_and_portfolio():
     for symbol in dynamic_list:
         count += 1
         print(f"🔄 [{count}/{len(dynamic_list)}] {symbol}...", flush=True)
+        if count % MEMORY_CHECK_EVERY == 0: pressure = memory_self_check()
+        if pressure == "HARD" and symbol not in essential:
+            print(f"🧯 {symbol} ignoré (budget mémoire)")
+            continue
         try:
             live_price = 0
             if all_tickers and symbol in all_tickers:
@@ -320,15 +430,13 @@ def analyze_market_and_portfolio():
                 print(f"⚠️ PRIX MANQUANT pour {symbol}")
                 continue
             
-            inds = calculate_all_indicators(symbol)
+            inds = calculate_all_indicators(symbol, light=(pressure != "OK"))
             
             if inds is None:
                 results.append({
-                    "Crypto": symbol.replace("/USDC", ""), "Prix": smart_format(live_price), "Mon_Bag": "-",
-                    "Conseil": "⚠️ DATA ERROR", "Action": "", "Score": -9999, "Mise ($)": "-", "Frais Est.": "-",
-                    "SL Déclenchement": "-", "SL Limite": "-", "Trailing Stop": "-", "TP (Cible)": "-",
-                    "R:R": "-", "RSI": "-", "ADX": "-", "Vol Ratio": "-", "Dist MA200%": "-",
-                    "Update": "", "Analyse Complète 🧠": "Données techniques insuffisantes."
+                    "Crypto": symbol.replace("/USDC", ""), "Prix": live_price,
+                    "Conseil": "⚠️ DATA ERROR", "Action": "", "Score": -9999,
+                    "Analyse Complète 🧠": "Données techniques insuffisantes."
                 })
                 continue
 
@@ -355,10 +463,15 @@ def analyze_market_and_portfolio():
             else: 
                 narrative.append("Mode Range")
                 support_zone = max(inds["bb_lower"], inds["pivot_s1"])
+                # Seuls les supports significatifs de l'index (pas le niveau brut le plus proche)
+                key_support = inds["levels"].key_support_below(live_price, SUPPORT_TOUCH_PCT)
+                if key_support: support_zone = max(support_zone, key_support[0])
                 dist_to_support = (live_price - support_zone) / live_price
                 
-                if abs(dist_to_support) < 0.015: 
+                if abs(dist_to_support) < SUPPORT_TOUCH_PCT: 
                     score += 40; narrative.append("🟢 Support Touché")
+                    if key_support and support_zone == key_support[0]:
+                        narrative.append(f"{key_support[1]} (x{key_support[2] + 1})")
                     stop_loss = support_zone * 0.99 
                     tp_target = inds["ema50_1h"]
                     if inds["rsi"] < 40: score += 20; narrative.append("RSI Bas")
@@ -370,19 +483,27 @@ def analyze_market_and_portfolio():
             risk_per_share = live_price - stop_loss
             if risk_per_share <= 0: risk_per_share = live_price * 0.001 
             
+            # Une résistance indexée ne sert qu'à rapprocher une cible qui assure
+            # déjà le R:R minimum, jamais à repêcher une cible trop courte.
+            min_target = live_price + (risk_per_share * MIN_RR)
+            if tp_target >= min_target:
+                level_target = inds["levels"].key_resistance_above(min_target, tp_target)
+                if level_target:
+                    tp_target = level_target[0]; narrative.append(f"TP {level_target[1]} (x{level_target[2] + 1})")
+            
             if tp_target <= live_price: tp_target = live_price + (risk_per_share * 2.0)
             real_rr = round((tp_target - live_price) / risk_per_share, 2)
 
             pos_size_usd = 0
-            forced_msg = ""
+            forced_min = False
             risk_budget = total_capital * RISK_PER_TRADE_PCT 
             
             if "ACHAT" in advice:
-                if real_rr < 1.5:
+                if real_rr < MIN_RR:
                     advice = "⚪ NEUTRE"; narrative.append(f"Annulé (R:R {real_rr} faible)")
                 else:
                     pos_size_usd = (risk_budget / risk_per_share) * live_price
-                    if pos_size_usd < MIN_ORDER_SIZE_USD: pos_size_usd = MIN_ORDER_SIZE_USD; forced_msg = " (Min)"
+                    if pos_size_usd < MIN_ORDER_SIZE_USD: pos_size_usd = MIN_ORDER_SIZE_USD; forced_min = True
                     if pos_size_usd > cash_usd: pos_size_usd = cash_usd
             
             fees_est = pos_size_usd * 0.001
@@ -396,9 +517,7 @@ def analyze_market_and_portfolio():
                 else: advice = "🟢 GARDER"
 
             full_narrative = " | ".join(narrative)
-            last_signal = "AUCUN"
-            relevant = [r for r in history_records if r.get("Crypto") == symbol]
-            if relevant: last_signal = relevant[-1].get("Signal", "AUCUN")
+            last_signal = last_signals.get(symbol, "AUCUN")
             
             full_signal = f"{action} {advice}".strip()
             is_new = False
@@ -415,25 +534,25 @@ def analyze_market_and_portfolio():
 
             results.append({
                 "Crypto": symbol.replace("/USDC", ""),
-                "Prix": smart_format(live_price),
-                "Mon_Bag": smart_format(value_owned) if value_owned > 10 else "-",
+                "Prix": live_price,
+                "Mon_Bag": value_owned if value_owned > 10 else None,
                 "Conseil": advice,
                 "Action": action,
-                "Mise ($)": f"{smart_format(pos_size_usd)}{forced_msg}" if "ACHAT" in advice else "-",
-                "Frais Est.": f"{smart_format(fees_est)}" if "ACHAT" in advice else "-",
+                "Mise ($)": pos_size_usd if "ACHAT" in advice else None,
+                "Mise Min": forced_min and "ACHAT" in advice,
+                "Frais Est.": fees_est if "ACHAT" in advice else None,
                 
-                "SL Déclenchement": smart_format(stop_loss), 
-                "SL Limite": smart_format(stop_loss_limit),         
-                "Trailing Stop": smart_format(trailing),
-                "TP (Cible)": smart_format(tp_target),    
+                "SL Déclenchement": float(stop_loss), 
+                "SL Limite": float(stop_loss_limit),         
+                "Trailing Stop": float(trailing),
+                "TP (Cible)": float(tp_target),    
                 
                 "Score": score,
                 "R:R": real_rr,
-                "RSI": round(inds["rsi"], 1),
-                "ADX": round(inds["adx"], 1),
-                "Vol Ratio": round(inds["vol_ratio"], 1),
-                "Dist MA200%": round(inds["dist_ma200"], 1),
-                "Update": "",
+                "RSI": inds["rsi"],
+                "ADX": inds["adx"],
+                "Vol Ratio": inds["vol_ratio"],
+                "Dist MA200%": inds["dist_ma200"],
                 "Analyse Complète 🧠": full_narrative
             })
 
@@ -447,25 +566,30 @@ def analyze_market_and_portfolio():
             try: ws = sh.worksheet("PortfolioManager")
             except: ws = sh.add_worksheet("PortfolioManager", 100, 20)
             
-            df = pd.DataFrame(results)
-            df = df.sort_values(by=["Score"], ascending=False)
-            df_final = pd.concat([df[df["Score"] >= 1999], df[df["Score"] < 1999]])
-            
-            paris_tz = pytz.timezone('Europe/Paris')
-            df_final["Update"] = datetime.now(paris_tz).strftime("%d/%m/%Y - %H:%M")
-            
             cols = ["Crypto", "Prix", "Mon_Bag", "Conseil", "Action", 
                     "Mise ($)", "Frais Est.", 
                     "SL Déclenchement", "SL Limite", "Trailing Stop", "TP (Cible)", 
                     "Score", "R:R", "RSI", "ADX", "Vol Ratio", "Dist MA200%", 
                     "Update", "Analyse Complète 🧠"]
             
+            df = compact_results(pd.DataFrame(results).reindex(columns=cols + ["Mise Min"]))
+            results.clear()
+            df = df.sort_values(by=["Score"], ascending=False)
+            df_final = pd.concat([df[df["Score"] >= 1999], df[df["Score"] < 1999]])
+            
+            paris_tz = pytz.timezone('Europe/Paris')
+            df_final["Update"] = datetime.now(paris_tz).strftime("%d/%m/%Y - %H:%M")
+            
             ws.clear()
-            set_with_dataframe(ws, df_final[cols])
+            set_with_dataframe(ws, format_for_sheet(df_final)[cols])
             print(f"🚀 Sheet V30 Safety mis à jour !", flush=True)
         except Exception as e:
             print(f"❌ Erreur Ecriture Sheet: {e}", flush=True)
 
+    if MEMORY_MODE:
+        release_memory()
+        print(f"🧯 RSS fin de cycle : {current_rss_mb():.0f}/{MEMORY_BUDGET_MB:.0f} Mo", flush=True)
+
 # ======================================================
 # 🔄 SERVEUR
 # ======================================================
@@ -0,0 +1,185 @@
+import math
+from bisect import bisect_left, bisect_right
+from collections import deque, Counter
+
+# ======================================================
+# 📐 INDEX DES NIVEAUX SUPPORT / RÉSISTANCE
+# ======================================================
+PIVOT_DAYS = 5             # jours de pivots conservés
+SWING_WINDOW = 3           # bougies de chaque côté pour valider un swing
+CANDLE_WINDOW = {"1h": 168, "1d": 60}  # bougies closes gardées par timeframe
+VP_TIMEFRAME = "1h"        # timeframe du profil de volume
+VP_BIN_PCT = 0.0025        # largeur d'une case du profil (0.25 %)
+VP_NODES = 6               # nombre de noeuds de volume indexés
+# Niveaux significatifs par côté : pivots S1/S2 (R1/R2) du dernier jour et
+# swings journaliers ; un noeud de volume ou un swing 1h seulement s'il est en
+# confluence avec un niveau significatif d'un autre type à moins de CONFLUENCE_PCT.
+STRONG_LABELS = {
+    "support": {"pivot:S1", "pivot:S2", "swing_low:1d"},
+    "resistance": {"pivot:R1", "pivot:R2", "swing_high:1d"},
+}
+CONFLUENCE_LABELS = {
+    "support": {"vp:node", "swing_low:1h"},
+    "resistance": {"vp:node", "swing_high:1h"},
+}
+CONFLUENCE_PCT = 0.003
+
+_VP_LOG_STEP = math.log(1 + VP_BIN_PCT)
+
+
+def pivot_levels(high, low, close):
+    """Pivots classiques, Fibonacci et Camarilla d'une bougie (H, L, C)."""
+    p = (high + low + close) / 3
+    rng = high - low
+    return [
+        (p, "pivot:P"),
+        (2 * p - low, "pivot:R1"), (2 * p - high, "pivot:S1"),
+        (p + rng, "pivot:R2"), (p - rng, "pivot:S2"),
+        (high + 2 * (p - low), "pivot:R3"), (low - 2 * (high - p), "pivot:S3"),
+        (p + 0.382 * rng, "fib:R1"), (p - 0.382 * rng, "fib:S1"),
+        (p + 0.618 * rng, "fib:R2"), (p - 0.618 * rng, "fib:S2"),
+        # fib R3/S3 (p ± rng) sont identiques à pivot R2/S2 : non dupliqués
+        (close + rng * 1.1 / 12, "cam:R1"), (close - rng * 1.1 / 12, "cam:S1"),
+        (close + rng * 1.1 / 6, "cam:R2"), (close - rng * 1.1 / 6, "cam:S2"),
+        (close + rng * 1.1 / 4, "cam:R3"), (close - rng * 1.1 / 4, "cam:S3"),
+        (close + rng * 1.1 / 2, "cam:R4"), (close - rng * 1.1 / 2, "cam:S4"),
+    ]
+
+
+class LevelIndex:
+    """Niveaux d'une crypto gardés triés, mis à jour bougie close par bougie close.
+
+    Chaque niveau appartient à un groupe (pivots d'un jour, un swing, le profil
+    de volume) : seul le groupe touché par une nouvelle bougie est remplacé.
+    """
+
+    def __init__(self):
+        self.prices = []   # trié, parallèle à self.entries
+        self.entries = []  # (label, clé de groupe)
+        self._groups = {}
+        self._last_ts = {}
+        self._candles = {tf: deque() for tf in CANDLE_WINDOW}
+        self._pivot_days = deque()
+        self._swings = {tf: deque() for tf in CANDLE_WINDOW}
+        self._vp = Counter()
+
+    # --- Maintenance des tableaux triés ---
+    def _add_group(self, key, levels):
+        self._drop_group(key)
+        levels = [(float(price), label) for price, label in levels if price > 0 and not math.isnan(price)]
+        for price, label in levels:
+            i = bisect_right(self.prices, price)
+            self.prices.insert(i, price)
+            self.entries.insert(i, (label, key))
+        self._groups[key] = levels
+
+    def _drop_group(self, key):
+        for price, label in self._groups.pop(key, []):
+            i = bisect_left(self.prices, price)
+            while self.entries[i] != (label, key): i += 1
+            del self.prices[i]
+            del self.entries[i]
+
+    # --- Mise à jour incrémentale ---
+    def update(self, timeframe, df):
+        """Intègre les bougies closes de df (la dernière, en cours, est ignorée)."""
+        if df is None or len(df) < 2 or timeframe not in CANDLE_WINDOW: return 0
+        closed = df.iloc[:-1]
+        last = self._last_ts.get(timeframe)
+        if last is not None: closed = closed[closed["ts"] > last]
+        if closed.empty: return 0
+
+        for row in closed.itertuples(index=False):
+            self._on_close(timeframe, row.ts, float(row.high), float(row.low), float(row.close), float(row.volume))
+        self._last_ts[timeframe] = closed["ts"].iloc[-1]
+        if timeframe == VP_TIMEFRAME: self._refresh_volume_nodes()
+        return len(closed)
+
+    def _on_close(self, tf, ts, high, low, close, volume):
+        candles = self._candles[tf]
+        candles.append((ts, high, low, close, volume))
+        if tf == VP_TIMEFRAME: self._vp[self._vp_bin((high + low + close) / 3)] += volume
+
+        if len(candles) > CANDLE_WINDOW[tf]:
+            old = candles.popleft()
+            if tf == VP_TIMEFRAME:
+                b = self._vp_bin((old[1] + old[2] + old[3]) / 3)
+                self._vp[b] -= old[4]
+                if self._vp[b] <= 0: del self._vp[b]
+            swings = self._swings[tf]
+            while swings and swings[0] <= old[0]:
+                self._drop_group(("swing", tf, swings.popleft()))
+
+        if tf == "1d":
+            self._add_group(("pivot", ts), pivot_levels(high, low, close))
+            self._pivot_days.append(ts)
+            while len(self._pivot_days) > PIVOT_DAYS:
+                self._drop_group(("pivot", self._pivot_days.popleft()))
+
+        self._detect_swing(tf)
+
+    def _detect_swing(self, tf):
+        candles = self._candles[tf]
+        span = 2 * SWING_WINDOW + 1
+        if len(candles) < span: return
+        window = [candles[i] for i in range(len(candles) - span, len(candles))]
+        mid = window[SWING_WINDOW]
+        levels = []
+        if mid[1] >= max(c[1] for c in window): levels.append((mid[1], f"swing_high:{tf}"))
+        if mid[2] <= min(c[2] for c in window): levels.append((mid[2], f"swing_low:{tf}"))
+        if levels:
+            self._add_group(("swing", tf, mid[0]), levels)
+            self._swings[tf].append(mid[0])
+
+    def _vp_bin(self, price):
+        return int(math.floor(math.log(price) / _VP_LOG_STEP)) if price > 0 else 0
+
+    def _refresh_volume_nodes(self):
+        peaks = [(vol, b) for b, vol in self._vp.items()
+                 if all(self._vp.get(b + k, 0) <= vol for k in (-2, -1, 1, 2))]
+        peaks.sort(reverse=True)
+        self._add_group(("vp",), [(math.exp((b + 0.5) * _VP_LOG_STEP), "vp:node") for _, b in peaks[:VP_NODES]])
+
+    # --- Requêtes O(log n) ---
+    def key_support_below(self, price, within_pct):
+        """Support significatif le plus proche dans [price*(1-within_pct), price[ ou None.
+
+        Ne parcourt que la bande sous price : (prix, label, confluence) où
+        confluence = nombre de niveaux significatifs d'un autre type à moins de CONFLUENCE_PCT.
+        """
+        floor = price * (1 - within_pct)
+        j = bisect_left(self.prices, price) - 1
+        while j >= 0 and self.prices[j] >= floor:
+            found = self._key_level(j, "support")
+            if found: return found
+            j -= 1
+        return None
+
+    def key_resistance_above(self, price, limit):
+        """Résistance significative la plus proche dans [price, limit[ ou None (même format)."""
+        j = bisect_left(self.prices, price)
+        while j < len(self.prices) and self.prices[j] < limit:
+            found = self._key_level(j, "resistance")
+            if found: return found
+            j += 1
+        return None
+
+    def _key_level(self, j, side):
+        if not self._is_key(j, side): return None
+        label = self.entries[j][0]
+        confluence = self._key_confluence(j, side)
+        if label in STRONG_LABELS[side] or confluence > 0:
+            return self.prices[j], label, confluence
+        return None
+
+    def _is_key(self, j, side):
+        label, key = self.entries[j]
+        if label.startswith("pivot:"):
+            return label in STRONG_LABELS[side] and self._pivot_days and key == ("pivot", self._pivot_days[-1])
+        return label in STRONG_LABELS[side] or label in CONFLUENCE_LABELS[side]
+
+    def _key_confluence(self, j, side):
+        level, label = self.prices[j], self.entries[j][0]
+        lo = bisect_left(self.prices, level * (1 - CONFLUENCE_PCT))
+        hi = bisect_right(self.prices, level * (1 + CONFLUENCE_PCT))
+        return sum(1 for k in range(lo, hi) if self.entries[k][0] != label and self._is_key(k, side))
@@ -0,0 +1,86 @@
+import os
+import gc
+import time
+import ctypes
+import threading
+from collections import OrderedDict
+
+# ======================================================
+# 🧯 BUDGET MÉMOIRE
+# ======================================================
+# MEMORY_BUDGET_MB = 0 désactive le mode budget (comportement historique).
+MEMORY_BUDGET_MB = float(os.getenv("MEMORY_BUDGET_MB", 0))
+MEMORY_SOFT_RATIO = float(os.getenv("MEMORY_SOFT_RATIO", 0.85))
+MEMORY_MODE = MEMORY_BUDGET_MB > 0
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_mb():
+    """RSS courant du process en Mo (0 si indisponible)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except Exception:
+        pass
+    try:
+        import resource
+        # ru_maxrss est un pic (Ko sous Linux), faute de mieux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception:
+        return 0.0
+
+
+def memory_pressure():
+    """'OK', 'SOFT' (proche du budget) ou 'HARD' (budget dépassé)."""
+    if not MEMORY_MODE: return "OK"
+    rss = current_rss_mb()
+    if rss >= MEMORY_BUDGET_MB: return "HARD"
+    if rss >= MEMORY_BUDGET_MB * MEMORY_SOFT_RATIO: return "SOFT"
+    return "OK"
+
+
+def release_memory():
+    """Force un passage du GC puis rend les pages libres à l'OS (glibc)."""
+    gc.collect()
+    try: ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except Exception: pass
+
+
+class LRUCache:
+    """Cache LRU borné, avec expiration optionnelle par entrée."""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None: return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        expires = now + ttl if ttl else None
+        with self._lock:
+            # Purge des entrées expirées pour ne pas les garder jusqu'à l'éviction LRU
+            for k in [k for k, (_, exp) in self._data.items() if exp is not None and exp < now]:
+                del self._data[k]
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock: self._data.clear()
+
+    def __len__(self): return len(self._data)
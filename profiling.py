@@ -0,0 +1,240 @@
+import threading
+import time
+import sys
+import os
+import io
+import json
+import hmac
+import marshal
+import cProfile
+import pstats
+import tracemalloc
+from collections import deque, Counter
+from functools import wraps
+from flask import Blueprint, Response, request
+
+# ======================================================
+# 🔬 PROFILAGE À LA DEMANDE
+# ======================================================
+# Rien n'est mesuré tant qu'aucune session n'est armée : le décorateur
+# ne fait qu'un test sur _ARMED avant d'appeler la fonction d'origine.
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", 5))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+MEMORY_TOP_N = 25
+# Routes désactivées (404) tant que PROFILE_TOKEN n'est pas défini ; sinon le
+# jeton est exigé en en-tête X-Profile-Token ou en paramètre token.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
+_ARMED = {}  # cible -> options de la prochaine exécution
+_LOCK = threading.Lock()
+_PROFILES = deque(maxlen=PROFILE_HISTORY)
+_NEXT_ID = [1]
+_TARGETS = set()
+SORT_KEYS = {key.value for key in pstats.SortKey} | set(pstats.Stats.sort_arg_dict_default)
+
+
+def arm(target, mode="cprofile", memory=False, top=MEMORY_TOP_N):
+    if target not in _TARGETS:
+        raise ValueError(f"Cible inconnue: {target}")
+    if mode not in ("cprofile", "sample"):
+        raise ValueError(f"Mode inconnu: {mode}")
+    if top <= 0:
+        raise ValueError(f"top doit être > 0: {top}")
+    with _LOCK:
+        _ARMED[target] = {"mode": mode, "memory": memory, "top": top}
+
+
+def disarm(target=None):
+    with _LOCK:
+        if target is None: _ARMED.clear()
+        else: _ARMED.pop(target, None)
+
+
+def _take(target):
+    with _LOCK:
+        return _ARMED.pop(target, None)
+
+
+class _Sampler:
+    """Échantillonneur de pile : lit la frame du thread ciblé à intervalle fixe."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self): self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common())
+
+
+def _run_profiled(target, opts, func, args, kwargs):
+    trace_mem = opts["memory"] and not tracemalloc.is_tracing()
+    if trace_mem: tracemalloc.start()
+
+    prof, sampler = None, None
+    if opts["mode"] == "sample":
+        sampler = _Sampler(threading.get_ident())
+        sampler.start()
+    else:
+        prof = cProfile.Profile()
+        prof.enable()
+
+    started = time.time()
+    t0 = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        duration = time.perf_counter() - t0
+        if prof: prof.disable()
+        if sampler: sampler.stop()
+
+        memory_top = None
+        if opts["memory"] and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            memory_top = [str(stat) for stat in snapshot.statistics("lineno")[:opts["top"]]]
+            if trace_mem: tracemalloc.stop()
+
+        entry = {
+            "target": target, "mode": opts["mode"],
+            "started": started, "duration": round(duration, 3),
+            "pstats": None, "collapsed": None, "memory": memory_top,
+        }
+        if prof:
+            prof.create_stats()
+            entry["pstats"] = marshal.dumps(prof.stats)
+        if sampler:
+            entry["collapsed"] = sampler.collapsed()
+
+        with _LOCK:
+            entry["id"] = _NEXT_ID[0]
+            _NEXT_ID[0] += 1
+            _PROFILES.append(entry)
+        print(f"🔬 Profil #{entry['id']} ({target}, {opts['mode']}) : {entry['duration']}s", flush=True)
+
+
+def profiled(func):
+    """Rend une fonction profilable via /profile/arm (aucun coût si non armée)."""
+    target = func.__name__
+    _TARGETS.add(target)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _ARMED: return func(*args, **kwargs)
+        opts = _take(target)
+        if opts is None: return func(*args, **kwargs)
+        return _run_profiled(target, opts, func, args, kwargs)
+
+    return wrapper
+
+
+def get_profile(profile_id):
+    with _LOCK:
+        for entry in _PROFILES:
+            if entry["id"] == profile_id: return entry
+    return None
+
+
+def list_profiles():
+    with _LOCK:
+        return [{
+            "id": e["id"], "target": e["target"], "mode": e["mode"],
+            "started": e["started"], "duration": e["duration"],
+            "formats": [f for f in ("pstats", "collapsed", "memory") if e[f]],
+        } for e in _PROFILES]
+
+
+class _StatsHolder:
+    """Adaptateur minimal pour recharger un profil sérialisé dans pstats.Stats."""
+
+    def __init__(self, stats): self.stats = stats
+
+    def create_stats(self): pass
+
+
+def pstats_text(entry, sort="cumulative", limit=50):
+    out = io.StringIO()
+    stats = pstats.Stats(_StatsHolder(marshal.loads(entry["pstats"])), stream=out)
+    stats.sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+# ======================================================
+# 🌐 ROUTES FLASK
+# ======================================================
+profiling_bp = Blueprint("profiling", __name__)
+
+
+def _json(data, status=200):
+    return Response(json.dumps(data, ensure_ascii=False), status=status, mimetype="application/json")
+
+
+@profiling_bp.before_request
+def _check_token():
+    if not PROFILE_TOKEN: return _json({"error": "Introuvable"}, 404)
+    token = request.headers.get("X-Profile-Token") or request.values.get("token") or ""
+    if not hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode()):
+        return _json({"error": "Jeton invalide"}, 403)
+
+
+@profiling_bp.route("/profile/arm", methods=["POST"])
+def profile_arm():
+    target = request.values.get("target", "")
+    mode = request.values.get("mode", "cprofile")
+    memory = request.values.get("memory", "0") in ("1", "true", "yes")
+    try:
+        top = int(request.values.get("top", MEMORY_TOP_N))
+        arm(target, mode, memory, top)
+    except ValueError as e:
+        return _json({"error": str(e), "targets": sorted(_TARGETS)}, 400)
+    return _json({"armed": target, "mode": mode, "memory": memory})
+
+
+@profiling_bp.route("/profile/disarm", methods=["POST"])
+def profile_disarm():
+    disarm(request.values.get("target"))
+    return _json({"armed": sorted(_ARMED)})
+
+
+@profiling_bp.route("/profile")
+def profile_list():
+    return _json({"armed": sorted(_ARMED), "targets": sorted(_TARGETS), "profiles": list_profiles()})
+
+
+@profiling_bp.route("/profile/<int:profile_id>")
+def profile_get(profile_id):
+    entry = get_profile(profile_id)
+    if entry is None: return _json({"error": "Profil introuvable"}, 404)
+
+    fmt = request.args.get("format", "text")
+    sort = request.args.get("sort", "cumulative")
+    if sort not in SORT_KEYS:
+        return _json({"error": f"Tri inconnu: {sort}", "sorts": sorted(SORT_KEYS)}, 400)
+    if fmt == "pstats" and entry["pstats"]:
+        return Response(entry["pstats"], mimetype="application/octet-stream", headers={
+            "Content-Disposition": f"attachment; filename={entry['target']}_{profile_id}.prof"})
+    if fmt == "text" and entry["pstats"]:
+        return Response(pstats_text(entry, sort), mimetype="text/plain")
+    if fmt in ("collapsed", "text") and entry["collapsed"]:
+        return Response(entry["collapsed"], mimetype="text/plain")
+    if fmt == "memory" and entry["memory"]:
+        return Response("\n".join(entry["memory"]), mimetype="text/plain")
+    return _json({"error": f"Format '{fmt}' indisponible pour ce profil"}, 404)